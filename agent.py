@@ -1,18 +1,23 @@
 import time
+import logging
 import uuid
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from config import logger, validate_config, PORT
-from models import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChoice, Message, ChatCompletionUsage
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from config import logger, validate_config, PORT, WORKERS, ENABLE_REQUEST_LOG, CORS_ORIGINS
+from models import (
+    ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChoice, Message, ChatCompletionUsage,
+    ChatCompletionChunk, ChatCompletionChunkChoice, DeltaMessage,
+)
 from intent_handler import IntentHandler
+from azure_service import get_azure_service
 
-app = FastAPI(title="Azure-Agent API", version="1.0.0")
+app = FastAPI(title="Azure-Agent API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -21,22 +26,35 @@ app.add_middleware(
 
 intent_handler = IntentHandler()
 
-@app.middleware("http")
+# The model registry is static, so its creation timestamp is fixed for the process lifetime
+_MODEL_CREATED = int(time.time())
+
 async def log_requests(request, call_next):
-    # Skip logging for OPTIONS/Preflight requests to keep logs clean
-    if request.method == "OPTIONS":
+    # Skip logging for OPTIONS/Preflight requests and health-check probes to keep logs clean,
+    # and skip all formatting when INFO is filtered out
+    if request.method == "OPTIONS" or request.url.path == "/health" or not logger.isEnabledFor(logging.INFO):
         return await call_next(request)
-        
-    logger.info(f"Incoming request: {request.method} {request.url.path}")
+
+    logger.info("Incoming request: %s %s", request.method, request.url.path)
     response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
+    logger.info("Response status: %s", response.status_code)
     return response
 
+if ENABLE_REQUEST_LOG:
+    app.middleware("http")(log_requests)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting Azure-Agent...")
     if not validate_config():
         logger.warning("Configuration is incomplete. Azure SDK calls will likely fail until .env is properly configured.")
+        return
+    # Pay the cold-start cost (token, TLS, ARM metadata) before the first chat request
+    await get_azure_service().warmup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_azure_service().close()
 
 @app.get("/health")
 def health():
@@ -60,7 +78,7 @@ async def list_models():
             {
                 "id": "azure-agent",
                 "object": "model",
-                "created": int(time.time()),
+                "created": _MODEL_CREATED,
                 "owned_by": "azure-agent",
                 "permission": [],
                 "root": "azure-agent",
@@ -69,6 +87,30 @@ async def list_models():
         ]
     }
 
+async def stream_chat_completion(model, user_message):
+    """Yield the intent handler's output as OpenAI-style server-sent event chunks."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def sse(delta, finish_reason=None):
+        chunk = ChatCompletionChunk(
+            id=completion_id,
+            created=created,
+            model=model,
+            choices=[ChatCompletionChunkChoice(index=0, delta=delta, finish_reason=finish_reason)]
+        )
+        return f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+
+    yield sse(DeltaMessage(role="assistant"))
+    try:
+        async for text in intent_handler.stream_query(user_message):
+            yield sse(DeltaMessage(content=text))
+    except Exception as e:
+        logger.error(f"Error streaming chat completion: {e}")
+        yield sse(DeltaMessage(content=f"Error processing request: {e}"))
+    yield sse(DeltaMessage(), finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
 @app.post("/v1/chat/completions", response_model=ChatCompletionResponse)
 async def chat_completions(request: ChatCompletionRequest):
     """OpenAI-compatible chat completions endpoint."""
@@ -79,12 +121,20 @@ async def chat_completions(request: ChatCompletionRequest):
         if not user_message:
             raise HTTPException(status_code=400, detail="No user message found in request")
 
-        # Process the query through the intent handler in a background thread
-        response_text = await run_in_threadpool(intent_handler.process_query, user_message)
+        # Streaming clients get rows as soon as Azure returns them
+        if request.stream:
+            return StreamingResponse(stream_chat_completion(request.model, user_message), media_type="text/event-stream")
+
+        # Process the query through the intent handler on the event loop
+        response_text = await intent_handler.process_query(user_message)
+
+        # Word counts as a rough token estimate, computed once for the usage block
+        prompt_tokens = len(user_message.split())
+        completion_tokens = len(response_text.split())
 
         # Build response
         response = ChatCompletionResponse(
-            id=f"chatcmpl-{uuid.uuid4()}",
+            id=f"chatcmpl-{uuid.uuid4().hex}",
             created=int(time.time()),
             model=request.model,
             choices=[
@@ -95,9 +145,9 @@ async def chat_completions(request: ChatCompletionRequest):
                 )
             ],
             usage=ChatCompletionUsage(
-                prompt_tokens=len(user_message.split()),
-                completion_tokens=len(response_text.split()),
-                total_tokens=len(user_message.split()) + len(response_text.split())
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
             )
         )
         return response
@@ -108,4 +158,5 @@ async def chat_completions(request: ChatCompletionRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    # Pass the app as an import string so uvicorn can spawn one process per worker
+    uvicorn.run("agent:app", host="0.0.0.0", port=PORT, workers=WORKERS)
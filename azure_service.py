@@ -1,61 +1,218 @@
+import asyncio
 import datetime
-from azure.identity import ClientSecretCredential
-from azure.mgmt.compute import ComputeManagementClient
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.monitor import MonitorManagementClient
-from azure.mgmt.resource import ResourceManagementClient
-from azure.mgmt.subscription import SubscriptionClient
-from azure.mgmt.resourcegraph import ResourceGraphClient
+import functools
+import re
+import time
+import numpy as np
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.identity import TokenCachePersistenceOptions
+from azure.identity.aio import ClientSecretCredential
+from azure.mgmt.compute.aio import ComputeManagementClient
+from azure.mgmt.network.aio import NetworkManagementClient
+from azure.mgmt.monitor.aio import MonitorManagementClient
+from azure.mgmt.resource.resources.aio import ResourceManagementClient
+from azure.mgmt.subscription.aio import SubscriptionClient
+from azure.mgmt.resourcegraph.aio import ResourceGraphClient
 from azure.mgmt.resourcegraph.models import QueryRequest
-from config import AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_SUBSCRIPTION_ID, logger
+from azure.monitor.query import MetricAggregationType
+from azure.monitor.query.aio import MetricsClient
+from config import (
+    AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_SUBSCRIPTION_ID,
+    AZURE_TOKEN_CACHE, AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED, CACHE_TTL, RESOURCE_TYPES_CACHE_TTL, METRICS_CONCURRENCY, logger,
+)
+
+# Resource group segment of an ARM resource ID (Azure returns both "resourceGroups" and "resourcegroups")
+_RG_RE = re.compile(r"/resourceGroups/([^/]+)", re.IGNORECASE)
+
+def _resource_group(resource_id):
+    """Extract the resource group name from an ARM resource ID."""
+    match = _RG_RE.search(resource_id) if resource_id else None
+    return match.group(1) if match else "Unknown"
+
+# Trailing "/providers/Microsoft.Insights/metrics/<metric name>" of a metric ID
+_METRIC_ID_SUFFIX_RE = re.compile(r"/providers/microsoft\.insights/metrics/[^/]*$", re.IGNORECASE)
+
+def _metric_resource_id(metric_id):
+    """ARM ID of the resource a metric ID belongs to."""
+    return _METRIC_ID_SUFFIX_RE.sub("", metric_id)
+
+ARM_SCOPE = "https://management.azure.com/.default"
+# metrics:getBatch accepts at most 50 resource IDs (same subscription and region) per call
+METRICS_BATCH_SIZE = 50
 
 class AzureService:
     def __init__(self):
+        # One transport (and so one aiohttp connection pool) shared by every client, so
+        # TCP/TLS sessions to ARM and AAD are reused across clients and requests.
+        # Per-attempt budget: 5s to connect, 8s to read.
+        self.transport = AioHttpTransport(connection_timeout=5, read_timeout=8)
+        # One retry with at most 2s backoff keeps a single SDK call to ~28s worst case
+        # (2 x 13s + 2s), inside the WebUI tool's 30s timeout. A Retry-After sent with a
+        # 429 is honored as-is and is not covered by this budget.
+        client_kwargs = {"transport": self.transport, "retry_total": 1, "retry_backoff_factor": 0.8, "retry_backoff_max": 2}
+        self._client_kwargs = client_kwargs
+
+        credential_kwargs = {}
+        if AZURE_TOKEN_CACHE:
+            credential_kwargs["cache_persistence_options"] = TokenCachePersistenceOptions(
+                name="azure-agent",
+                allow_unencrypted_storage=AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED
+            )
+
         self.credential = ClientSecretCredential(
             tenant_id=AZURE_TENANT_ID,
             client_id=AZURE_CLIENT_ID,
-            client_secret=AZURE_CLIENT_SECRET
+            client_secret=AZURE_CLIENT_SECRET,
+            **credential_kwargs,
+            **client_kwargs
         )
         self.subscription_id = AZURE_SUBSCRIPTION_ID
         
-        # Initialize Clients with 10s connection timeouts
-        self.resource_client = ResourceManagementClient(self.credential, self.subscription_id, connection_timeout=10)
-        self.compute_client = ComputeManagementClient(self.credential, self.subscription_id, connection_timeout=10)
-        self.network_client = NetworkManagementClient(self.credential, self.subscription_id, connection_timeout=10)
-        self.monitor_client = MonitorManagementClient(self.credential, self.subscription_id, connection_timeout=10)
-        self.graph_client = ResourceGraphClient(self.credential, connection_timeout=10)
-        self.subscription_client = SubscriptionClient(self.credential, connection_timeout=10)
-
-    def list_vms(self, resource_group=None):
-        """List all VMs in a subscription or specific resource group."""
+        # Initialize Clients
+        self.resource_client = ResourceManagementClient(self.credential, self.subscription_id, **client_kwargs)
+        self.compute_client = ComputeManagementClient(self.credential, self.subscription_id, **client_kwargs)
+        self.network_client = NetworkManagementClient(self.credential, self.subscription_id, **client_kwargs)
+        self.monitor_client = MonitorManagementClient(self.credential, self.subscription_id, **client_kwargs)
+        self.graph_client = ResourceGraphClient(self.credential, **client_kwargs)
+        self.subscription_client = SubscriptionClient(self.credential, **client_kwargs)
+        # Regional Metrics Batch API clients, created on first use: region -> MetricsClient
+        self.metrics_clients = {}
+        # Bounds concurrent per-resource metric calls so a large fan-out doesn't trip ARM throttling
+        self._metrics_semaphore = asyncio.Semaphore(METRICS_CONCURRENCY)
+
+        # key -> (monotonic timestamp, value) for listings that change slowly
+        self._cache = {}
+        self._cache_locks = {}
+
+    def _get_fresh(self, key, ttl=CACHE_TTL):
+        """Return the cached value for key if younger than ttl, else None. Never calls Azure."""
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        return None
+
+    async def _get_cached(self, key, loader, ttl=CACHE_TTL):
+        """Return a cached value for key, refreshing it with loader() once it is older than ttl."""
+        value = self._get_fresh(key, ttl)
+        if value is not None:
+            return value
+
+        # Single-flight: concurrent requests wait for one refresh instead of all hitting ARM
+        lock = self._cache_locks.get(key)
+        if lock is None:
+            lock = self._cache_locks[key] = asyncio.Lock()
+        async with lock:
+            value = self._get_fresh(key, ttl)
+            if value is not None:
+                return value
+
+            value = await loader()
+            # Never cache failures, the next request should retry
+            if not (isinstance(value, dict) and isinstance(value.get("error"), str)):
+                self._cache[key] = (time.monotonic(), value)
+            return value
+
+    async def warmup(self):
+        """Prime the credential, ARM metadata and connection pools with one cheap call."""
         try:
-            if resource_group:
-                vms = self.compute_client.virtual_machines.list(resource_group)
-            else:
-                vms = self.compute_client.virtual_machines.list_all()
-            
-            result = []
-            for vm in vms:
+            # Acquire the ARM token up front; every client shares this credential's cache
+            await self.credential.get_token(ARM_SCOPE)
+            async for _ in self.resource_client.resource_groups.list():
+                break
+            logger.info("Azure SDK clients warmed up")
+        except Exception as e:
+            logger.warning(f"Azure SDK warmup failed: {e}")
+
+    async def close(self):
+        """Close all clients, the credential and the shared transport."""
+        for client in (self.resource_client, self.compute_client, self.network_client,
+                       self.monitor_client, self.graph_client, self.subscription_client):
+            await client.close()
+        for client in self.metrics_clients.values():
+            await client.close()
+        await self.credential.close()
+        await self.transport.close()
+
+    async def iter_vms(self, resource_group=None):
+        """Yield VMs one at a time as ARM returns each page. Errors are raised to the caller."""
+        if resource_group:
+            vms = self.compute_client.virtual_machines.list(resource_group)
+        else:
+            vms = self.compute_client.virtual_machines.list_all()
+
+        try:
+            async for vm in vms:
                 # To get power state, we need an instance view or specific call
                 # For Phase 1 simplified list, we fetch name, location, and hardware profile
-                vm_data = {
+                yield {
+                    "id": vm.id,
                     "name": vm.name,
                     "location": vm.location,
                     "size": vm.hardware_profile.vm_size,
                     "os": vm.storage_profile.os_disk.os_type,
                     "provisioning_state": vm.provisioning_state,
-                    "resource_group": vm.id.split('/')[4] if vm.id else "Unknown"
+                    "resource_group": _resource_group(vm.id)
                 }
-                result.append(vm_data)
-            return result
         except Exception as e:
             logger.error(f"Error listing VMs: {e}")
+            raise
+
+    async def list_vms(self, resource_group=None):
+        """List all VMs in a subscription or specific resource group."""
+        try:
+            return [vm async for vm in self.iter_vms(resource_group)]
+        except Exception as e:
             return {"error": str(e)}
 
-    def get_vm_status(self, resource_group, vm_name):
+    async def get_cached_vms(self):
+        """Return the subscription's VM list, reusing one ARM listing for CACHE_TTL seconds."""
+        data = await self._get_cached("vms", self._load_vms)
+        return data if "error" in data else data["vms"]
+
+    def get_fresh_vms(self):
+        """Return the cached VM list if it is still fresh, else None."""
+        data = self._get_fresh("vms")
+        return data["vms"] if data else None
+
+    async def find_vm(self, name):
+        """Resolve one VM by name (case-insensitive). Returns None if it doesn't exist.
+
+        Answers from the VM cache when it is fresh and holds the name. Otherwise (including
+        VMs created since the cache was filled) it runs a single targeted Resource Graph
+        query instead of enumerating every VM in the subscription.
+        """
+        data = self._get_fresh("vms")
+        if data is not None:
+            vm = data["by_name"].get(name.lower())
+            if vm is not None:
+                return vm
+
+        kql_name = name.replace("\\", "\\\\").replace("'", "\\'")
+        resources = await self.query_resources(
+            "Microsoft.Compute/virtualMachines",
+            limit=1,
+            custom_where=f"name =~ '{kql_name}'",
+            project_fields="id, name, resourceGroup, location"
+        )
+        if isinstance(resources, dict) and "error" in resources:
+            return resources
+        if not resources:
+            return None
+
+        vm = resources[0]
+        return {"id": vm["id"], "name": vm["name"], "resource_group": vm["resourceGroup"], "location": vm["location"]}
+
+    async def _load_vms(self):
+        vms = await self.list_vms()
+        if isinstance(vms, dict) and "error" in vms:
+            return vms
+        # The list and its by-name index are cached as one entry so they always agree
+        return {"vms": vms, "by_name": {vm["name"].lower(): vm for vm in vms}}
+
+    async def get_vm_status(self, resource_group, vm_name):
         """Get detailed status of a specific VM."""
         try:
-            vm = self.compute_client.virtual_machines.get(resource_group, vm_name, expand='instanceView')
+            vm = await self.compute_client.virtual_machines.get(resource_group, vm_name, expand='instanceView')
             status = "Unknown"
             for s in vm.instance_view.statuses:
                 if s.code.startswith("PowerState/"):
@@ -72,10 +229,10 @@ class AzureService:
             logger.error(f"Error getting VM status: {e}")
             return {"error": str(e)}
 
-    def get_metrics(self, resource_id, metric_names=["Percentage CPU"], timespan="PT1H"):
+    async def get_metrics(self, resource_id, metric_names=["Percentage CPU"], timespan="PT1H"):
         """Fetch metrics for a specific resource."""
         try:
-            metrics_data = self.monitor_client.metrics.list(
+            metrics_data = await self.monitor_client.metrics.list(
                 resource_id,
                 timespan=timespan,
                 interval='PT1M',
@@ -85,85 +242,143 @@ class AzureService:
             
             result = {}
             for item in metrics_data.value:
-                name = item.name.localized_value
-                values = [round(v.average, 2) for v in item.timeseries[0].data if v.average is not None]
-                result[name] = values[-5:] if values else [] # Last 5 readings
+                # Key on the stable metric ID; localized_value is a display string that can vary
+                name = item.name.value
+                # float64 so tolist() gives back clean 2-decimal Python floats
+                values = np.fromiter((v.average for v in item.timeseries[0].data if v.average is not None), dtype=np.float64)
+                result[name] = np.round(values[-5:], 2).tolist() # Last 5 readings
             return result
         except Exception as e:
             logger.error(f"Error fetching metrics: {e}")
             return {"error": str(e)}
 
-    def list_resource_groups(self):
-        """List all resource groups."""
+    async def list_resource_groups(self):
+        """List all resource groups (cached for CACHE_TTL seconds)."""
+        return await self._get_cached("resource_groups", self._fetch_resource_groups)
+
+    async def _fetch_resource_groups(self):
         try:
             groups = self.resource_client.resource_groups.list()
-            return [{"name": g.name, "location": g.location} for g in groups]
+            return [{"name": g.name, "location": g.location} async for g in groups]
         except Exception as e:
             logger.error(f"Error listing resource groups: {e}")
             return {"error": str(e)}
 
-    def list_vnets(self):
-        """List all Virtual Networks."""
+    async def iter_vnets(self):
+        """Yield Virtual Networks as ARM returns each page. Errors are raised to the caller."""
         try:
-            vnets = self.network_client.virtual_networks.list_all()
-            result = []
-            for vnet in vnets:
-                result.append({
+            async for vnet in self.network_client.virtual_networks.list_all():
+                yield {
                     "name": vnet.name,
                     "location": vnet.location,
-                    "resource_group": vnet.id.split('/')[4],
+                    "resource_group": _resource_group(vnet.id),
                     "address_space": vnet.address_space.address_prefixes
-                })
-            return result
+                }
         except Exception as e:
             logger.error(f"Error listing VNets: {e}")
+            raise
+
+    async def list_vnets(self):
+        """List all Virtual Networks."""
+        try:
+            return [vnet async for vnet in self.iter_vnets()]
+        except Exception as e:
             return {"error": str(e)}
 
-    def list_public_ips(self):
-        """List all Public IP Addresses."""
+    async def iter_public_ips(self):
+        """Yield Public IP Addresses as ARM returns each page. Errors are raised to the caller."""
         try:
-            ips = self.network_client.public_ip_addresses.list_all()
-            result = []
-            for ip in ips:
-                result.append({
+            async for ip in self.network_client.public_ip_addresses.list_all():
+                yield {
                     "name": ip.name,
                     "location": ip.location,
-                    "resource_group": ip.id.split('/')[4],
+                    "resource_group": _resource_group(ip.id),
                     "ip_address": ip.ip_address if ip.ip_address else "Dynamic (N/A)",
                     "sku": ip.sku.name if ip.sku else "Basic"
-                })
-            return result
+                }
         except Exception as e:
             logger.error(f"Error listing Public IPs: {e}")
+            raise
+
+    async def list_public_ips(self):
+        """List all Public IP Addresses."""
+        try:
+            return [ip async for ip in self.iter_public_ips()]
+        except Exception as e:
             return {"error": str(e)}
 
-    def get_resource_metrics(self, resource_id, metric_name="Percentage CPU", timespan="PT24H"):
-        """Fetch a specific metric for a resource."""
+    async def get_resource_metrics(self, resource_id, metric_name="Percentage CPU", timespan="PT24H"):
+        """Fetch a specific metric for a resource. Safe to call concurrently with asyncio.gather."""
         try:
-            end_time = datetime.datetime.utcnow()
-            start_time = end_time - datetime.timedelta(hours=24)
+            async with self._metrics_semaphore:
+                metrics_data = await self.monitor_client.metrics.list(
+                    resource_id,
+                    timespan=timespan,
+                    interval='PT1H',
+                    metricnames=metric_name,
+                    aggregation='Maximum'
+                )
             
-            metrics_data = self.monitor_client.metrics.list(
-                resource_id,
-                timespan=timespan,
-                interval='PT1H',
-                metricnames=metric_name,
-                aggregation='Maximum'
+            vals = np.fromiter(
+                (data.maximum for item in metrics_data.value for timeseries in item.timeseries
+                 for data in timeseries.data if data.maximum is not None),
+                dtype=np.float64
             )
-            
-            vals = []
-            for item in metrics_data.value:
-                for timeseries in item.timeseries:
-                    for data in timeseries.data:
-                        if data.maximum is not None:
-                            vals.append(data.maximum)
-            
-            return max(vals) if vals else 0
+            return float(vals.max()) if vals.size else 0
         except Exception as e:
             logger.error(f"Error fetching metrics for {resource_id}: {e}")
             return 0
 
-    def query_resources(self, resource_type_filter: str = None, limit: int = 20, custom_where: str = None, project_fields: str = None):
+    def _get_metrics_client(self, region):
+        client = self.metrics_clients.get(region)
+        if client is None:
+            client = MetricsClient(f"https://{region}.metrics.monitor.azure.com", self.credential, **self._client_kwargs)
+            self.metrics_clients[region] = client
+        return client
+
+    async def get_metrics_batch(self, resources, metric_name="Percentage CPU", metric_namespace="Microsoft.Compute/virtualMachines"):
+        """Fetch the 24h peak of one metric for many resources via the Metrics Batch API.
+
+        resources are dicts with "id" and "location". Returns {lowercase resource id: peak}.
+        """
+        # The batch endpoint is regional, so group IDs by region and chunk each group
+        ids_by_region = {}
+        for res in resources:
+            ids_by_region.setdefault(res["location"], []).append(res["id"])
+
+        try:
+            batches = await asyncio.gather(*[
+                self._get_metrics_client(region).query_resources(
+                    resource_ids=ids[i:i + METRICS_BATCH_SIZE],
+                    metric_namespace=metric_namespace,
+                    metric_names=[metric_name],
+                    timespan=datetime.timedelta(hours=24),
+                    granularity=datetime.timedelta(hours=1),
+                    aggregations=[MetricAggregationType.MAXIMUM]
+                )
+                for region, ids in ids_by_region.items()
+                for i in range(0, len(ids), METRICS_BATCH_SIZE)
+            ])
+
+            result = {}
+            for batch in batches:
+                for res in batch:
+                    # Batch results don't carry the resource ID; recover it from the metric ID
+                    if not res.metrics:
+                        continue
+                    resource_id = _metric_resource_id(res.metrics[0].id)
+                    vals = np.fromiter(
+                        (data.maximum for metric in res.metrics for timeseries in metric.timeseries
+                         for data in timeseries.data if data.maximum is not None),
+                        dtype=np.float64
+                    )
+                    result[resource_id.lower()] = float(vals.max()) if vals.size else 0
+            return result
+        except Exception as e:
+            logger.error(f"Error fetching batch metrics: {e}")
+            return {"error": str(e)}
+
+    async def query_resources(self, resource_type_filter: str = None, limit: int = 20, custom_where: str = None, project_fields: str = None):
         """Query any resource type using Azure Resource Graph with optimized projection."""
         try:
             query = "resources"
@@ -190,29 +405,41 @@ class AzureService:
                 query=query
             )
             
-            # Execute with a 20-second timeout to stay within the tool's 30s limit
-            response = self.graph_client.resources(request)
+            # Bounded by the shared transport timeouts and retry budget set in __init__
+            response = await self.graph_client.resources(request)
             return response.data
         except Exception as e:
             logger.error(f"Error querying Resource Graph: {e}")
             return {"error": str(e)}
 
-    def get_resource_types(self):
-        """Fetch all unique resource types present in the subscription."""
+    async def get_lowered_resource_types(self):
+        """Return (type, type.lower()) for every resource type present in the subscription.
+
+        Cached for RESOURCE_TYPES_CACHE_TTL, so callers can fuzzy-match without re-lowercasing.
+        """
+        data = await self._get_cached("resource_types", self._fetch_resource_types, ttl=RESOURCE_TYPES_CACHE_TTL)
+        return [] if "error" in data else data["lowered"]
+
+    async def _fetch_resource_types(self):
         try:
             query = "resources | summarize count() by type | project type"
             request = QueryRequest(subscriptions=[self.subscription_id], query=query)
-            response = self.graph_client.resources(request)
-            return [r['type'] for r in response.data]
+            response = await self.graph_client.resources(request)
+            return {"lowered": [(r['type'], r['type'].lower()) for r in response.data]}
         except Exception as e:
             logger.error(f"Error fetching schema: {e}")
-            return []
+            return {"error": str(e)}
 
-    def list_subscriptions(self):
+    async def list_subscriptions(self):
         """List all subscriptions the credential has access to."""
         try:
             subs = self.subscription_client.subscriptions.list()
-            return [{"id": s.subscription_id, "display_name": s.display_name, "state": s.state} for s in subs]
+            return [{"id": s.subscription_id, "display_name": s.display_name, "state": s.state} async for s in subs]
         except Exception as e:
             logger.error(f"Error listing subscriptions: {e}")
             return {"error": str(e)}
+
+@functools.lru_cache(maxsize=1)
+def get_azure_service():
+    """Return the process-wide AzureService, creating it on first use."""
+    return AzureService()
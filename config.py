@@ -1,5 +1,9 @@
 import os
+import sys
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -10,16 +14,42 @@ AZURE_TENANT_ID = os.getenv("AZURE_TENANT_ID")
 AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID")
 AZURE_CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET")
 AZURE_SUBSCRIPTION_ID = os.getenv("AZURE_SUBSCRIPTION_ID")
+# Persist AAD tokens on disk so restarts reuse them (needs libsecret, or allow unencrypted storage)
+AZURE_TOKEN_CACHE = os.getenv("AZURE_TOKEN_CACHE", "false").lower() == "true"
+AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED = os.getenv("AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED", "false").lower() == "true"
 
 # App Configuration
 PORT = int(os.getenv("PORT", 6003))
+# Uvicorn worker processes. Opt-in: each worker keeps its own credential, clients and caches,
+# and os.cpu_count() reports host CPUs inside containers, so the default is a single process
+WORKERS = int(os.getenv("WORKERS", 1))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Comma-separated browser origins allowed by CORS, e.g. "https://webui.example.com"
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
+# Per-request access logging middleware; disable to rely on uvicorn's access log
+ENABLE_REQUEST_LOG = os.getenv("ENABLE_REQUEST_LOG", "true").lower() == "true"
+# Seconds to reuse subscription listings (VM index, resource groups) between requests
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+# The set of resource types in a subscription changes rarely, so keep it longer
+RESOURCE_TYPES_CACHE_TTL = int(os.getenv("RESOURCE_TYPES_CACHE_TTL", 600))
+# Max concurrent per-resource Azure Monitor calls when fanning out metric lookups
+METRICS_CONCURRENCY = int(os.getenv("METRICS_CONCURRENCY", 10))
 
 # Logging Setup
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
-)
+# Records are handed to a queue on the calling thread; a background listener
+# thread does the formatting and stream writes so the event loop never blocks on I/O
+_stream_handler = logging.StreamHandler(sys.stderr)
+_stream_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, _stream_handler, respect_handler_level=True)
+_queue_handler = QueueHandler(log_queue)
+# Attached directly rather than via basicConfig, which would give the queue handler
+# a formatter of its own; the listener's handler applies the only real format
+_root_logger = logging.getLogger()
+_root_logger.setLevel(getattr(logging, LOG_LEVEL))
+_root_logger.addHandler(_queue_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("azure-agent")
 
 def validate_config():
@@ -1,167 +1,338 @@
 import re
-from azure_service import AzureService
+import sys
+import asyncio
+from azure_service import get_azure_service
 from config import logger, AZURE_SUBSCRIPTION_ID
 
-# Robust Mapping: Groups of aliases for each Azure Resource Provider
-AZURE_RESOURCES = [
-    {"provider": "Microsoft.Compute/virtualMachines", "aliases": ["vm", "virtual machine", "vms", "instances"]},
-    {"provider": "Microsoft.Web/sites", "aliases": ["web app", "webapp", "function", "app service", "site", "serverless"]},
-    {"provider": "Microsoft.ContainerService/managedClusters", "aliases": ["aks", "kubernetes", "k8s", "cluster"]},
-    {"provider": "Microsoft.Storage/storageAccounts", "aliases": ["storage", "stg", "blob", "account", "file share"]},
-    {"provider": "Microsoft.Sql/servers/databases", "aliases": ["sql", "database", "db"]},
-    {"provider": "Microsoft.DocumentDB/databaseAccounts", "aliases": ["cosmos", "nosql", "documentdb"]},
-    {"provider": "Microsoft.Network/virtualNetworks", "aliases": ["vnet", "network", "virtual network"]},
-    {"provider": "Microsoft.Network/networkSecurityGroups", "aliases": ["nsg", "firewall", "security group"]},
-    {"provider": "Microsoft.KeyVault/vaults", "aliases": ["key vault", "kv", "secret", "vault"]},
-    {"provider": "Microsoft.Network/publicIPAddresses", "aliases": ["public ip", "pip", "ip address"]},
-    {"provider": "Microsoft.Compute/disks", "aliases": ["disk", "vhd", "drive"]},
-    {"provider": "Microsoft.Network/networkInterfaces", "aliases": ["nic", "network interface", "adapter"]},
-    {"provider": "Microsoft.Insights/components", "aliases": ["app insights", "application insights", "monitor", "telemetry"]},
-    {"provider": "Microsoft.OperationalInsights/workspaces", "aliases": ["log analytics", "workspace", "logs"]},
-    {"provider": "Microsoft.ContainerRegistry/registries", "aliases": ["acr", "registry", "docker registry"]},
-    {"provider": "Microsoft.ApiManagement/service", "aliases": ["apim", "api management"]},
-    {"provider": "Microsoft.Logic/workflows", "aliases": ["logic app", "workflow"]},
-    {"provider": "Microsoft.ServiceBus/namespaces", "aliases": ["service bus", "bus", "queue", "topic"]},
-    {"provider": "Microsoft.EventHub/namespaces", "aliases": ["event hub", "hub"]},
-    {"provider": "Microsoft.RecoveryServices/vaults", "aliases": ["recovery services", "asr", "backup", "vault"]},
-    {"provider": "Microsoft.Cache/Redis", "aliases": ["redis", "cache"]}
+# Robust Mapping: Groups of aliases for each Azure Resource Provider.
+# Read-only (provider, aliases) pairs with interned strings.
+AZURE_RESOURCES = tuple(
+    (sys.intern(provider), tuple(sys.intern(alias) for alias in aliases))
+    for provider, aliases in (
+        ("Microsoft.Compute/virtualMachines", ("vm", "virtual machine", "vms", "instances")),
+        ("Microsoft.Web/sites", ("web app", "webapp", "function", "app service", "site", "serverless")),
+        ("Microsoft.ContainerService/managedClusters", ("aks", "kubernetes", "k8s", "cluster")),
+        ("Microsoft.Storage/storageAccounts", ("storage", "stg", "blob", "account", "file share")),
+        ("Microsoft.Sql/servers/databases", ("sql", "database", "db")),
+        ("Microsoft.DocumentDB/databaseAccounts", ("cosmos", "nosql", "documentdb")),
+        ("Microsoft.Network/virtualNetworks", ("vnet", "network", "virtual network")),
+        ("Microsoft.Network/networkSecurityGroups", ("nsg", "firewall", "security group")),
+        ("Microsoft.KeyVault/vaults", ("key vault", "kv", "secret", "vault")),
+        ("Microsoft.Network/publicIPAddresses", ("public ip", "pip", "ip address")),
+        ("Microsoft.Compute/disks", ("disk", "vhd", "drive")),
+        ("Microsoft.Network/networkInterfaces", ("nic", "network interface", "adapter")),
+        ("Microsoft.Insights/components", ("app insights", "application insights", "monitor", "telemetry")),
+        ("Microsoft.OperationalInsights/workspaces", ("log analytics", "workspace", "logs")),
+        ("Microsoft.ContainerRegistry/registries", ("acr", "registry", "docker registry")),
+        ("Microsoft.ApiManagement/service", ("apim", "api management")),
+        ("Microsoft.Logic/workflows", ("logic app", "workflow")),
+        ("Microsoft.ServiceBus/namespaces", ("service bus", "bus", "queue", "topic")),
+        ("Microsoft.EventHub/namespaces", ("event hub", "hub")),
+        ("Microsoft.RecoveryServices/vaults", ("recovery services", "asr", "backup", "vault")),
+        ("Microsoft.Cache/Redis", ("redis", "cache"))
+    )
+)
+
+# Intent patterns, compiled once at import instead of on every request
+_PERF_RE = re.compile(r"(?P<metric>cpu|memory)(?:\s+\w+){0,3}\s+(?:is|was|were|are|of)?\s*(?P<dir>greater|higher|more|above|less|below|under)\s*(?:than|to|of)?\s*(?P<n>\d+)(?:%)?")
+# Comparison word captured by _PERF_RE -> filter direction
+_DIR_MAP = {
+    **dict.fromkeys(["greater", "higher", "more", "above"], "greater"),
+    **dict.fromkeys(["less", "below", "under"], "less"),
+}
+_VM_STATUS_RE = re.compile(r"(status|health|state) of (?:vm|virtual machine) ([\w-]+)")
+_METRICS_RE = re.compile(r"(cpu|memory|metrics) (?:for|of) ([\w-]+)")
+
+# Plain substring keywords -> the intent (or discovery qualifier) they signal. All of them are
+# found in one pass over the query and _route then checks the collected set in priority order.
+_INTENT_KEYWORDS = {
+    **dict.fromkeys(["what can you do", "help", "capabilities", "list features"], "help"),
+    **dict.fromkeys(["list vms", "show vms", "show all vms", "get vms"], "list_vms"),
+    **dict.fromkeys(["disk count", "no of disks", "number of disks", "disks attached"], "disk_count"),
+    **dict.fromkeys(["resource groups", "list rgs", "show rgs"], "list_rgs"),
+    **dict.fromkeys(["vnets", "networks", "virtual network"], "list_vnets"),
+    **dict.fromkeys(["public ips", "ip addresses", "ips"], "list_public_ips"),
+    **dict.fromkeys(["list subscriptions", "show subscriptions"], "list_subscriptions"),
+    # Resource-state qualifiers for discovery queries
+    "unattached": "unattached",
+    **dict.fromkeys(["stopped", "deallocated", "shutdown"], "stopped"),
+}
+# The zero-width lookahead tries every start position, so overlapping keywords
+# ("ips" inside "public ips") are all reported, matching plain `kw in query` semantics
+_INTENT_KEYWORDS_RE = re.compile("(?=(" + "|".join(re.escape(kw) for kw in sorted(_INTENT_KEYWORDS, key=len, reverse=True)) + "))")
+
+# Resource Graph filters for the discovery state qualifiers
+_UNATTACHED_FILTER = "properties.diskState == 'Unattached' or properties.state == 'Unattached' or isempty(managedBy)"
+_RUNNING_FILTER = "properties.extended.instanceView.powerState.displayStatus has 'running'"
+_STOPPED_FILTER = "properties.extended.instanceView.powerState.displayStatus has 'stopped' or properties.state == 'Stopped'"
+
+# alias -> provider; built from the reversed list so the first provider wins for shared aliases ("vault")
+_ALIAS_TO_PROVIDER = {alias: provider for provider, aliases in reversed(AZURE_RESOURCES) for alias in aliases}
+# Word-boundary match with an optional plural 's'; longest aliases first so "virtual network" beats "network"
+_ALIAS_RE = re.compile(r"\b(" + "|".join(re.escape(a) for a in sorted(_ALIAS_TO_PROVIDER, key=len, reverse=True)) + r")s?\b")
+
+# The most common phrasings, answered with one dict lookup before any pattern runs.
+# Every entry must resolve to the same handler the full intent chain in _route would pick.
+_QUICK_INTENTS = {
+    "help": "_handle_help",
+    "what can you do": "_handle_help",
+    "capabilities": "_handle_help",
+    "list vms": "_handle_list_vms",
+    "show vms": "_handle_list_vms",
+    "show all vms": "_handle_list_vms",
+    "get vms": "_handle_list_vms",
+    "disk count": "_handle_vm_disk_count",
+    "list resource groups": "_handle_list_rgs",
+    "show resource groups": "_handle_list_rgs",
+    "list rgs": "_handle_list_rgs",
+    "show rgs": "_handle_list_rgs",
+    "list vnets": "_handle_list_vnets",
+    "show vnets": "_handle_list_vnets",
+    "list virtual networks": "_handle_list_vnets",
+    "list public ips": "_handle_list_public_ips",
+    "show public ips": "_handle_list_public_ips",
+    "list subscriptions": "_handle_list_subscriptions",
+    "show subscriptions": "_handle_list_subscriptions",
+}
+
+# Intent matchers: each takes the lowercased query and the keyword set and returns the
+# handler args when its intent fires, or None. () is a valid (empty) match.
+def _match_perf(query, keywords):
+    # e.g. "CPU greater than 60", "cpu utilization was higher than 80%", "memory below 20%"
+    m = _PERF_RE.search(query)
+    if m:
+        # The comparison word is captured by the pattern itself, no second scan of the query
+        return (m.group("metric"), _DIR_MAP[m.group("dir")], int(m.group("n")))
+    return None
+
+def _match_keyword(intent):
+    return lambda query, keywords: () if intent in keywords else None
+
+def _match_vm_status(query, keywords):
+    m = _VM_STATUS_RE.search(query)
+    return (m.group(2),) if m else None
+
+def _match_metrics(query, keywords):
+    m = _METRICS_RE.search(query)
+    return (m.group(2),) if m else None
+
+def _match_alias(query, keywords):
+    # One pass of the combined alias pattern instead of a regex search per alias
+    # (word boundaries prevent "vm" matching "vmname", trailing 's' handles plurals)
+    m = _ALIAS_RE.search(query)
+    if not m:
+        return None
+    alias = m.group(1)
+    state_filter = None
+    if "unattached" in keywords:
+        state_filter = _UNATTACHED_FILTER
+    elif "stopped" in keywords:
+        state_filter = _STOPPED_FILTER
+    return (alias, _ALIAS_TO_PROVIDER[alias], state_filter)
+
+# (matcher, handler) in priority order; the first matcher that fires decides the intent
+_INTENT_CHAIN = [
+    (_match_perf, "_handle_performance_filter"),
+    (_match_keyword("help"), "_handle_help"),
+    (_match_keyword("list_vms"), "_handle_list_vms"),
+    (_match_keyword("disk_count"), "_handle_vm_disk_count"),
+    (_match_vm_status, "_handle_vm_status"),
+    (_match_metrics, "_handle_metrics"),
+    (_match_keyword("list_rgs"), "_handle_list_rgs"),
+    (_match_keyword("list_vnets"), "_handle_list_vnets"),
+    (_match_keyword("list_public_ips"), "_handle_list_public_ips"),
+    (_match_keyword("list_subscriptions"), "_handle_list_subscriptions"),
+    (_match_alias, "_handle_generic_discovery"),
 ]
 
+# VM metrics fetched together in one Azure Monitor call, keyed by metric ID -> (label, display unit, divisor).
+# Values are 1-minute averages, so "Network In Total" is the bytes received in each minute.
+_VM_METRICS = {
+    "Percentage CPU": ("CPU", "%", 1),
+    "Available Memory Bytes": ("Available Memory", " MB", 1024 * 1024),
+    "Network In Total": ("Network In", " MB/min", 1024 * 1024),
+}
+
+# Static responses, built once at import
+_HELP_MARKDOWN = (
+    "### 🤖 Azure-Agent Capabilities\n\n"
+    "I can help you monitor and discover your Azure infrastructure using natural language. "
+    "Here are the specific things I can do:\n\n"
+    "#### 🖥️ Compute\n"
+    "- **List VMs**: 'Show all my virtual machines'\n"
+    "- **VM Status**: 'What is the status of VM web-server-01?'\n"
+    "- **Metrics**: 'Show CPU for MyVMName' or 'Memory for analytics-db'\n"
+    "- **Inventory**: 'Disk count for all VMs'\n\n"
+    "#### 🌐 Networking\n"
+    "- **VNets**: 'List all virtual networks'\n"
+    "- **Public IPs**: 'Show my public IP addresses'\n"
+    "- **State Alerts**: 'List unattached disks' or 'Show stopped VMs'\n\n"
+    "#### 📂 Organization & Discovery\n"
+    "- **Subscriptions**: 'List all my subscriptions'\n"
+    "- **Resource Groups**: 'List resource groups'\n"
+    "- **Wide Discovery**: I can find **100+ resource types** (SQL, Storage, Key Vaults, AKS, Firewalls, etc.). "
+    "Just ask: 'Show all storage accounts' or 'List my key vaults'.\n\n"
+    "--- \n"
+    "*Note: I am currently in read-only mode (Phase 1).* "
+)
+
+_UNKNOWN_QUERY_MARKDOWN = (
+    "I'm sorry, I couldn't determine the specific Azure action for that query.\n\n"
+    "Try asking things like:\n"
+    "- 'Show all VMs'\n"
+    "- 'Status of VM MyVMName'\n"
+    "- 'CPU for MyVMName'\n"
+    "- 'List resource groups'"
+)
+
+# Static markdown table headers (column row + alignment row), shared by every response
+_VM_TABLE_HEADER = "| Name | Resource Group | Location | Size | OS | State |\n| :--- | :--- | :--- | :--- | :--- | :--- |"
+_VNET_TABLE_HEADER = "| Name | Resource Group | Location | Address Prefix |\n| :--- | :--- | :--- | :--- |"
+_PIP_TABLE_HEADER = "| Name | IP Address | Resource Group | Location | SKU |\n| :--- | :--- | :--- | :--- | :--- |"
+_RESOURCE_TABLE_HEADER = "| Name | Resource Group | Location | Type |\n| :--- | :--- | :--- | :--- |"
+_SEARCH_TABLE_HEADER = "| Name | Type | Resource Group | Location |\n| :--- | :--- | :--- | :--- |"
+_SUBSCRIPTION_TABLE_HEADER = "| Subscription Name | Subscription ID | State |\n| :--- | :--- | :--- |"
+_PERF_TABLE_HEADER = "| VM Name | Resource Group | Peak Usage |\n| :--- | :--- | :--- |"
+_DISK_TABLE_HEADER = "| VM Name | Resource Group | Total Disks |\n| :--- | :--- | :--- |"
+
+def _vm_row(vm):
+    return f"| {vm['name']} | {vm['resource_group']} | {vm['location']} | {vm['size']} | {vm['os']} | {vm['provisioning_state']} |"
+
+def _vnet_row(vnet):
+    return f"| {vnet['name']} | {vnet['resource_group']} | {vnet['location']} | {', '.join(vnet['address_space'])} |"
+
+def _pip_row(ip):
+    return f"| {ip['name']} | {ip['ip_address']} | {ip['resource_group']} | {ip['location']} | {ip['sku']} |"
+
+async def _stream_table(rows, title, header, empty_message, error_prefix):
+    """Yield a markdown table chunk by chunk: the title and header with the first row, then one row per chunk."""
+    found = False
+    try:
+        async for row in rows:
+            if not found:
+                found = True
+                yield f"{title}\n\n{header}\n"
+            yield row + "\n"
+    except Exception as e:
+        yield f"{error_prefix}: {e}"
+        return
+
+    if not found:
+        yield empty_message
+
 class IntentHandler:
+    # Handlers whose output can be streamed row by row -> their async generator counterpart
+    _STREAMERS = {
+        "_handle_list_vms": "_stream_list_vms",
+        "_handle_list_vnets": "_stream_list_vnets",
+        "_handle_list_public_ips": "_stream_list_public_ips",
+    }
+
     def __init__(self):
-        self.azure = AzureService()
+        self.azure = get_azure_service()
 
-    def process_query(self, query: str) -> str:
+    async def process_query(self, query: str) -> str:
         """Parse query, fetch data, and return a markdown response."""
+        handler, args = await self._route(query)
+        return await handler(*args)
+
+    async def stream_query(self, query: str):
+        """Like process_query, but yields the markdown in chunks as the data arrives."""
+        handler, args = await self._route(query)
+        streamer = self._STREAMERS.get(handler.__name__)
+        if streamer:
+            async for chunk in getattr(self, streamer)(*args):
+                yield chunk
+        else:
+            yield await handler(*args)
+
+    async def _route(self, query: str):
+        """Map a query to the (handler, args) that will answer it."""
         query = query.lower()
         logger.info(f"Processing query: {query}")
-
-        # Intent: Advanced Metrics Filtering (e.g., CPU > 60%)
-        # Matches: "CPU greater than 60", "cpu utilization was higher than 80%", "memory below 20%"
-        perf_match = re.search(r"(cpu|memory)(?:\s+\w+){0,3}\s+(?:is|was|were|are|of)?\s*(?:greater|higher|more|above|less|below|under)\s*(?:than|to|of)?\s*(\d+)(?:%)?", query)
-        if perf_match:
-            logger.info(f"Matched Intent: Advanced Metrics Filtering (Regex: {perf_match.group(0)})")
-            metric_type = perf_match.group(1)
-            # Find the direction manually for better accuracy
-            direction = "greater" if any(kw in query for kw in ["greater", "higher", "more", "above"]) else "less"
-            threshold = int(perf_match.group(2))
-            return self._handle_performance_filter(metric_type, direction, threshold)
-
-        # Intent: Capabilities / Help
-        if any(kw in query for kw in ["what can you do", "help", "capabilities", "list features"]):
-            logger.info("Matched Intent: Capabilities/Help")
-            return self._handle_help()
-
-        # Intent: List VMs
-        if any(kw in query for kw in ["list vms", "show vms", "show all vms", "get vms"]):
-            logger.info("Matched Intent: List VMs")
-            return self._handle_list_vms()
-
-        # Intent: VM Disk Inventory/Count
-        if any(kw in query for kw in ["disk count", "no of disks", "number of disks", "disks attached"]):
-            logger.info("Matched Intent: VM Disk Inventory/Count")
-            return self._handle_vm_disk_count()
-
-        # Intent: VM Status/Health
-        vm_status_match = re.search(r"(status|health|state) of (?:vm|virtual machine) ([\w-]+)", query)
-        if vm_status_match:
-            vm_name = vm_status_match.group(2)
-            return self._handle_vm_status(vm_name)
-
-        # Intent: CPU/Metrics
-        metrics_match = re.search(r"(cpu|memory|metrics) (?:for|of) ([\w-]+)", query)
-        if metrics_match:
-            resource_name = metrics_match.group(2)
-            return self._handle_metrics(resource_name)
-
-        # Intent: List Resource Groups
-        if any(kw in query for kw in ["resource groups", "list rgs", "show rgs"]):
-            return self._handle_list_rgs()
-
-        # Intent: List Virtual Networks
-        if any(kw in query for kw in ["vnets", "networks", "virtual network"]):
-            return self._handle_list_vnets()
-
-        # Intent: List Public IPs
-        if any(kw in query for kw in ["public ips", "ip addresses", "ips"]):
-            return self._handle_list_public_ips()
-
-        # Intent: List Subscriptions
-        if any(kw in query for kw in ["list subscriptions", "show subscriptions"]):
-            logger.info("Matched Intent: List Subscriptions")
-            return self._handle_list_subscriptions()
-
-        # Enhanced Resource Discovery
-        # We check every alias for every resource group defined above
-        for resource in AZURE_RESOURCES:
-            provider = resource["provider"]
-            for alias in resource["aliases"]:
-                # Use regex for word-boundary matching (prevents "vm" matching "vmname")
-                # Also handles optional trailing 's' for plurals
-                pattern = rf"\b{alias}s?\b"
-                if re.search(pattern, query):
-                    logger.info(f"Matched Resource: {alias} -> {provider}")
-                    state_filter = None
-                    if "unattached" in query:
-                        state_filter = "properties.diskState == 'Unattached' or properties.state == 'Unattached' or isempty(managedBy)"
-                    elif any(kw in query for kw in ["stopped", "deallocated", "shutdown"]):
-                        state_filter = "properties.extended.instanceView.powerState.displayStatus has 'stopped' or properties.state == 'Stopped'"
-                    
-                    return self._handle_generic_discovery(alias, provider, state_filter)
-
-        # FINAL FALLBACK: Semantic Discovery
+        # Tokenize once; the tokens feed both the fast path and the semantic fallback
+        tokens = query.split()
+
+        # Fast path: exact common phrasings (whitespace and trailing punctuation ignored).
+        # Leading-token prefixes are not dispatched on: "show ..." / "list ..." can still be
+        # a perf filter, a status lookup or a discovery query depending on the rest of the text.
+        quick = _QUICK_INTENTS.get(" ".join(tokens).rstrip("?.!"))
+        if quick:
+            logger.info(f"Matched Quick Intent: {quick}")
+            return getattr(self, quick), ()
+
+        # Every keyword-driven intent is decided from this single scan
+        keywords = {_INTENT_KEYWORDS[m.group(1)] for m in _INTENT_KEYWORDS_RE.finditer(query)}
+
+        for matcher, handler in _INTENT_CHAIN:
+            args = matcher(query, keywords)
+            if args is not None:
+                logger.info("Matched Intent: %s", handler)
+                # Args carry user-supplied names, so keep them out of the INFO log
+                logger.debug("Intent args: %s", args)
+                return getattr(self, handler), args
+
+        # FINAL FALLBACK: Semantic Discovery, only reached when no intent in the chain fired.
         # We query Azure to see what types actually exist, then fuzzy-match against the user's query
+        # Nothing to match on for "hi" / "??" style queries, so skip the resource type lookup
+        words = [w for w in tokens if len(w) > 3]
+        if not words:
+            return self._handle_unknown, ()
+
         logger.info("Starting Semantic Discovery Fallback...")
-        available_types = self.azure.get_resource_types()
-        
+        available_types = await self.azure.get_lowered_resource_types()
+
         # Look for a type that contains any word from the user's query
-        words = [w for w in query.split() if len(w) > 3]
-        for azure_type in available_types:
-            type_parts = azure_type.lower().split('/')
+        for azure_type, type_lower in available_types:
             # Check if any word from the query matches any part of the resource type
-            if any(word in type_parts[-1] or word in azure_type.lower() for word in words):
+            if any(word in type_lower for word in words):
                 logger.info(f"Semantically Matched: {azure_type}")
-                return self._handle_generic_discovery(words[0], azure_type)
+                return self._handle_generic_discovery, (words[0], azure_type)
 
         # Still nothing? Try a broad property search
-        if words:
-            return self._handle_dynamic_search(words[:3])
+        return self._handle_dynamic_search, (words[:3],)
 
-        # Default fallback
-        return (
-            "I'm sorry, I couldn't determine the specific Azure action for that query.\n\n"
-            "Try asking things like:\n"
-            "- 'Show all VMs'\n"
-            "- 'Status of VM MyVMName'\n"
-            "- 'CPU for MyVMName'\n"
-            "- 'List resource groups'"
-        )
+    async def _handle_unknown(self):
+        return _UNKNOWN_QUERY_MARKDOWN
 
-    def _handle_list_vms(self):
-        vms = self.azure.list_vms()
+    async def _handle_list_vms(self):
+        vms = await self.azure.get_cached_vms()
         if isinstance(vms, dict) and "error" in vms:
             return f"Error fetching VMs: {vms['error']}"
         
         if not vms:
             return "No Virtual Machines found in the current subscription."
 
-        response = f"### Virtual Machines (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n\n"
-        response += "| Name | Resource Group | Location | Size | OS | State |\n"
-        response += "| :--- | :--- | :--- | :--- | :--- | :--- |\n"
-        for vm in vms:
-            response += f"| {vm['name']} | {vm['resource_group']} | {vm['location']} | {vm['size']} | {vm['os']} | {vm['provisioning_state']} |\n"
-        
-        return response
+        parts = [f"### Virtual Machines (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n", _VM_TABLE_HEADER]
+        parts.extend(_vm_row(vm) for vm in vms)
+        return "\n".join(parts) + "\n"
+
+    async def _stream_list_vms(self):
+        # A fresh cached listing is already complete, send it in one piece
+        if self.azure.get_fresh_vms() is not None:
+            yield await self._handle_list_vms()
+            return
+
+        # Otherwise emit rows as ARM pages arrive instead of waiting for the whole subscription
+        async for chunk in _stream_table(
+            (_vm_row(vm) async for vm in self.azure.iter_vms()),
+            f"### Virtual Machines (Subscription: `{AZURE_SUBSCRIPTION_ID}`)",
+            _VM_TABLE_HEADER,
+            "No Virtual Machines found in the current subscription.",
+            "Error fetching VMs"
+        ):
+            yield chunk
+
+    async def _handle_vm_status(self, vm_name):
+        # We need the resource group: from the VM cache, or one targeted Resource Graph lookup
+        target_vm = await self.azure.find_vm(vm_name)
+        if isinstance(target_vm, dict) and "error" in target_vm:
+            return f"Error looking up VM `{vm_name}`: {target_vm['error']}"
 
-    def _handle_vm_status(self, vm_name):
-        # We need the resource group. For simplicity in Phase 1, let's search for it.
-        vms = self.azure.list_vms()
-        target_vm = next((v for v in vms if v['name'].lower() == vm_name.lower()), None)
-        
         if not target_vm:
             return f"Could not find VM named `{vm_name}` in the subscription."
 
-        status = self.azure.get_vm_status(target_vm['resource_group'], target_vm['name'])
+        status = await self.azure.get_vm_status(target_vm['resource_group'], target_vm['name'])
         if isinstance(status, dict) and "error" in status:
             return f"Error fetching status for `{vm_name}`: {status['error']}"
 
@@ -174,138 +345,169 @@ class IntentHandler:
             f"- **Location:** {status['location']}"
         )
 
-    def _handle_metrics(self, resource_name):
-        # Again, search for resource ID
-        vms = self.azure.list_vms()
-        target_vm = next((v for v in vms if v['name'].lower() == resource_name.lower()), None)
-        
+    async def _handle_metrics(self, resource_name):
+        # Again, resolve the resource ID without listing every VM
+        target_vm = await self.azure.find_vm(resource_name)
+        if isinstance(target_vm, dict) and "error" in target_vm:
+            return f"Error looking up VM `{resource_name}`: {target_vm['error']}"
+
         if not target_vm:
             # Maybe it's not a VM, but for Phase 1 we focus on VMs
             return f"Could not find a Virtual Machine named `{resource_name}` to fetch metrics."
 
-        # Reconstruct resource ID (approximated for Phase 1)
-        resource_id = f"/subscriptions/{AZURE_SUBSCRIPTION_ID}/resourceGroups/{target_vm['resource_group']}/providers/Microsoft.Compute/virtualMachines/{target_vm['name']}"
-        
-        metrics = self.azure.get_metrics(resource_id)
+        # All metric names go in a single request (Azure Monitor accepts up to 20)
+        metrics = await self.azure.get_metrics(target_vm['id'], list(_VM_METRICS))
         if "error" in metrics:
             return f"Error fetching metrics: {metrics['error']}"
 
-        response = f"### Latest Metrics for `{target_vm['name']}`\n\n"
-        for name, values in metrics.items():
-            val_str = ", ".join([f"{v}%" for v in values]) if values else "N/A"
-            response += f"- **{name}:** {val_str} (Last 5 mins)\n"
-        
+        parts = [f"### Latest Metrics for `{target_vm['name']}`\n"]
         if not metrics:
-            response += "No metric data available for this resource in the last hour."
-            
-        return response
+            parts.append("No metric data available for this resource in the last hour.")
+            return "\n".join(parts)
 
-    def _handle_list_rgs(self):
-        rgs = self.azure.list_resource_groups()
+        for metric_id, values in metrics.items():
+            label, unit, divisor = _VM_METRICS.get(metric_id, (metric_id, "", 1))
+            val_str = ", ".join([f"{round(v / divisor, 2)}{unit}" for v in values]) if values else "N/A"
+            parts.append(f"- **{label}:** {val_str} (last 5 one-minute averages)")
+        return "\n".join(parts) + "\n"
+
+    async def _handle_list_rgs(self):
+        rgs = await self.azure.list_resource_groups()
         if isinstance(rgs, dict) and "error" in rgs:
             return f"Error fetching Resource Groups: {rgs['error']}"
 
-        response = "### Resource Groups\n\n"
-        for rg in rgs:
-            response += f"- `{rg['name']}` ({rg['location']})\n"
-        return response
+        parts = ["### Resource Groups\n"]
+        parts.extend(f"- `{rg['name']}` ({rg['location']})" for rg in rgs)
+        return "\n".join(parts) + "\n"
 
-    def _handle_list_vnets(self):
-        vnets = self.azure.list_vnets()
+    async def _handle_list_vnets(self):
+        vnets = await self.azure.list_vnets()
         if isinstance(vnets, dict) and "error" in vnets:
             return f"Error fetching VNets: {vnets['error']}"
 
         if not vnets:
             return "No Virtual Networks found in the current subscription."
 
-        response = f"### Virtual Networks (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n\n"
-        response += "| Name | Resource Group | Location | Address Prefix |\n"
-        response += "| :--- | :--- | :--- | :--- |\n"
-        for vnet in vnets:
-            prefixes = ", ".join(vnet['address_space'])
-            response += f"| {vnet['name']} | {vnet['resource_group']} | {vnet['location']} | {prefixes} |\n"
-        return response
-
-    def _handle_list_public_ips(self):
-        ips = self.azure.list_public_ips()
+        parts = [
+            f"### Virtual Networks (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n",
+            _VNET_TABLE_HEADER,
+        ]
+        parts.extend(_vnet_row(vnet) for vnet in vnets)
+        return "\n".join(parts) + "\n"
+
+    async def _stream_list_vnets(self):
+        async for chunk in _stream_table(
+            (_vnet_row(vnet) async for vnet in self.azure.iter_vnets()),
+            f"### Virtual Networks (Subscription: `{AZURE_SUBSCRIPTION_ID}`)",
+            _VNET_TABLE_HEADER,
+            "No Virtual Networks found in the current subscription.",
+            "Error fetching VNets"
+        ):
+            yield chunk
+
+    async def _handle_list_public_ips(self):
+        ips = await self.azure.list_public_ips()
         if isinstance(ips, dict) and "error" in ips:
             return f"Error fetching Public IPs: {ips['error']}"
 
         if not ips:
             return "No Public IP Addresses found."
 
-        response = f"### Public IP Addresses (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n\n"
-        response += "| Name | IP Address | Resource Group | Location | SKU |\n"
-        response += "| :--- | :--- | :--- | :--- | :--- |\n"
-        for ip in ips:
-            response += f"| {ip['name']} | {ip['ip_address']} | {ip['resource_group']} | {ip['location']} | {ip['sku']} |\n"
-        return response
-
-    def _handle_generic_discovery(self, keyword, provider, state_filter=None):
-        resources = self.azure.query_resources(provider, custom_where=state_filter)
+        parts = [
+            f"### Public IP Addresses (Subscription: `{AZURE_SUBSCRIPTION_ID}`)\n",
+            _PIP_TABLE_HEADER,
+        ]
+        parts.extend(_pip_row(ip) for ip in ips)
+        return "\n".join(parts) + "\n"
+
+    async def _stream_list_public_ips(self):
+        async for chunk in _stream_table(
+            (_pip_row(ip) async for ip in self.azure.iter_public_ips()),
+            f"### Public IP Addresses (Subscription: `{AZURE_SUBSCRIPTION_ID}`)",
+            _PIP_TABLE_HEADER,
+            "No Public IP Addresses found.",
+            "Error fetching Public IPs"
+        ):
+            yield chunk
+
+    async def _handle_generic_discovery(self, keyword, provider, state_filter=None):
+        resources = await self.azure.query_resources(provider, custom_where=state_filter)
         if isinstance(resources, dict) and "error" in resources:
             return f"Error discoverying {keyword}: {resources['error']}"
 
         if not resources:
             return f"No `{keyword}` resources found in the current subscription."
 
-        response = f"### Azure {keyword.title()} Resources\n\n"
-        response += "| Name | Resource Group | Location | Type |\n"
-        response += "| :--- | :--- | :--- | :--- |\n"
-        for res in resources:
-            response += f"| {res['name']} | {res['resourceGroup']} | {res['location']} | {res['type'].split('/')[-1]} |\n"
-        
-        return response
+        parts = [
+            f"### Azure {keyword.title()} Resources\n",
+            _RESOURCE_TABLE_HEADER,
+        ]
+        parts.extend(
+            f"| {res['name']} | {res['resourceGroup']} | {res['location']} | {res['type'].split('/')[-1]} |"
+            for res in resources
+        )
+        return "\n".join(parts) + "\n"
 
-    def _handle_dynamic_search(self, keywords):
+    async def _handle_dynamic_search(self, keywords):
         """Try to find any resource where the type or name contains the provided keywords."""
         filters = " or ".join([f"type contains '{kw}' or name contains '{kw}'" for kw in keywords])
-        resources = self.azure.query_resources(custom_where=filters, limit=10)
+        resources = await self.azure.query_resources(custom_where=filters, limit=10)
         
         if not resources:
             return "I couldn't find any resources matching those keywords in your subscription."
 
-        response = "### 🔍 Discovery Results\n\n"
-        response += "I found these resources that might match your query:\n\n"
-        response += "| Name | Type | Resource Group | Location |\n"
-        response += "| :--- | :--- | :--- | :--- |\n"
-        for res in resources:
-            response += f"| {res['name']} | `{res['type'].split('/')[-1]}` | {res['resourceGroup']} | {res['location']} |\n"
-        
-        return response
+        parts = [
+            "### 🔍 Discovery Results\n",
+            "I found these resources that might match your query:\n",
+            _SEARCH_TABLE_HEADER,
+        ]
+        parts.extend(
+            f"| {res['name']} | `{res['type'].split('/')[-1]}` | {res['resourceGroup']} | {res['location']} |"
+            for res in resources
+        )
+        return "\n".join(parts) + "\n"
 
-    def _handle_list_subscriptions(self):
-        subs = self.azure.list_subscriptions()
+    async def _handle_list_subscriptions(self):
+        subs = await self.azure.list_subscriptions()
         if isinstance(subs, dict) and "error" in subs:
             return f"Error fetching subscriptions: {subs['error']}"
 
         if not subs:
             return "No subscriptions found for the current credential."
 
-        response = "### Accessible Azure Subscriptions\n\n"
-        response += "| Subscription Name | Subscription ID | State |\n"
-        response += "| :--- | :--- | :--- |\n"
-        for sub in subs:
-            response += f"| {sub['display_name']} | `{sub['id']}` | {sub['state']} |\n"
-        
-        return response
+        parts = ["### Accessible Azure Subscriptions\n", _SUBSCRIPTION_TABLE_HEADER]
+        parts.extend(f"| {sub['display_name']} | `{sub['id']}` | {sub['state']} |" for sub in subs)
+        return "\n".join(parts) + "\n"
 
-    def _handle_performance_filter(self, metric_type, direction, threshold):
-        # 1. Get List of VMs with IDs from Resource Graph (Fast)
+    async def _handle_performance_filter(self, metric_type, direction, threshold):
+        # 1. Get List of running VMs with IDs from Resource Graph (Fast). Stopped VMs report
+        # no meaningful usage, so they are filtered out server-side before any metric call.
         project = "id, name, resourceGroup, location"
-        vms = self.azure.query_resources("Microsoft.Compute/virtualMachines", project_fields=project, limit=20)
+        vms = await self.azure.query_resources(
+            "Microsoft.Compute/virtualMachines",
+            custom_where=_RUNNING_FILTER,
+            project_fields=project,
+            limit=20
+        )
         
+        if isinstance(vms, dict) and "error" in vms:
+            return f"Error fetching VMs: {vms['error']}"
+
         if not vms:
             return "No VMs found to analyze performance."
 
         metric_name = "Percentage CPU" if metric_type == "cpu" else "Available Memory Bytes"
         
+        # 2. One Metrics Batch API call per region (50 VMs each) instead of one call per VM
+        peaks = await self.azure.get_metrics_batch(vms, metric_name)
+        if "error" in peaks:
+            # Batch endpoint unavailable: the per-VM calls are independent, so fan them out concurrently
+            values = await asyncio.gather(*[self.azure.get_resource_metrics(vm['id'], metric_name) for vm in vms])
+        else:
+            values = [peaks.get(vm['id'].lower(), 0) for vm in vms]
+
         results = []
-        for vm in vms:
-            # Note: In a real production env, you'd use a background task / orchestration here
-            # But for Phase 1, we do a targeted batch scan.
-            val = self.azure.get_resource_metrics(vm['id'], metric_name)
-            
+        for vm, val in zip(vms, values):
             # Simple filtering logic
             if direction in ["greater", "higher", "more"] and val > threshold:
                 results.append({"name": vm['name'], "rg": vm['resourceGroup'], "val": val})
@@ -315,45 +517,23 @@ class IntentHandler:
         if not results:
             return f"No VMs found with {metric_type.upper()} usage {direction} than {threshold}%."
 
-        response = f"### 🚀 VMs with {metric_type.upper()} {direction} than {threshold}%\n"
-        response += f"*Analysis period: Last 24 hours (Max Aggregation)*\n\n"
-        response += "| VM Name | Resource Group | Peak Usage |\n"
-        response += "| :--- | :--- | :--- |\n"
-        for r in results:
-            unit = "%" if metric_type == "cpu" else " MB"
-            val_display = f"{r['val']:.1f}{unit}"
-            response += f"| {r['name']} | {r['rg']} | **{val_display}** |\n"
-        
-        return response
+        unit = "%" if metric_type == "cpu" else " MB"
+        parts = [
+            f"### 🚀 VMs with {metric_type.upper()} {direction} than {threshold}%",
+            "*Analysis period: Last 24 hours (Max Aggregation)*\n",
+            _PERF_TABLE_HEADER,
+        ]
+        parts.extend(f"| {r['name']} | {r['rg']} | **{r['val']:.1f}{unit}** |" for r in results)
+        return "\n".join(parts) + "\n"
 
-    def _handle_help(self):
-        return (
-            "### 🤖 Azure-Agent Capabilities\n\n"
-            "I can help you monitor and discover your Azure infrastructure using natural language. "
-            "Here are the specific things I can do:\n\n"
-            "#### 🖥️ Compute\n"
-            "- **List VMs**: 'Show all my virtual machines'\n"
-            "- **VM Status**: 'What is the status of VM web-server-01?'\n"
-            "- **Metrics**: 'Show CPU for MyVMName' or 'Memory for analytics-db'\n"
-            "- **Inventory**: 'Disk count for all VMs'\n\n"
-            "#### 🌐 Networking\n"
-            "- **VNets**: 'List all virtual networks'\n"
-            "- **Public IPs**: 'Show my public IP addresses'\n"
-            "- **State Alerts**: 'List unattached disks' or 'Show stopped VMs'\n\n"
-            "#### 📂 Organization & Discovery\n"
-            "- **Subscriptions**: 'List all my subscriptions'\n"
-            "- **Resource Groups**: 'List resource groups'\n"
-            "- **Wide Discovery**: I can find **100+ resource types** (SQL, Storage, Key Vaults, AKS, Firewalls, etc.). "
-            "Just ask: 'Show all storage accounts' or 'List my key vaults'.\n\n"
-            "--- \n"
-            "*Note: I am currently in read-only mode (Phase 1).* "
-        )
+    async def _handle_help(self):
+        return _HELP_MARKDOWN
 
-    def _handle_vm_disk_count(self):
+    async def _handle_vm_disk_count(self):
         # Optimized Kusto query to project Name and calculate Disk Count
         # (array_length of dataDisks + 1 for OS disk)
         project = "name, resourceGroup, disk_count = array_length(properties.storageProfile.dataDisks) + 1"
-        resources = self.azure.query_resources("Microsoft.Compute/virtualMachines", project_fields=project)
+        resources = await self.azure.query_resources("Microsoft.Compute/virtualMachines", project_fields=project)
         
         if isinstance(resources, dict) and "error" in resources:
             return f"Error fetching disk counts: {resources['error']}"
@@ -361,11 +541,6 @@ class IntentHandler:
         if not resources:
             return "No Virtual Machines found to count disks."
 
-        response = "### VM Disk Inventory\n\n"
-        response += "| VM Name | Resource Group | Total Disks |\n"
-        response += "| :--- | :--- | :--- |\n"
-        for res in resources:
-            count = res.get('disk_count', 1)
-            response += f"| {res['name']} | {res['resourceGroup']} | {count} |\n"
-        
-        return response
+        parts = ["### VM Disk Inventory\n", _DISK_TABLE_HEADER]
+        parts.extend(f"| {res['name']} | {res['resourceGroup']} | {res.get('disk_count', 1)} |" for res in resources)
+        return "\n".join(parts) + "\n"
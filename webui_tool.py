@@ -1,4 +1,5 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from typing import Optional
 
@@ -7,6 +8,9 @@ class Tools:
         # The internal URL for the azure-agent container
         self.url = "http://azure-agent:6003/v1/chat/completions"
         self.headers = {"Content-Type": "application/json"}
+        # Reuse keep-alive connections to the agent instead of a new socket per query
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
 
     def query_azure(self, query: str) -> str:
         """
@@ -21,7 +25,7 @@ class Tools:
         }
 
         try:
-            response = requests.post(self.url, headers=self.headers, json=payload, timeout=30)
+            response = self.session.post(self.url, headers=self.headers, json=payload, timeout=30)
             response.raise_for_status()
             
             data = response.json()